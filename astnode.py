@@ -9,17 +9,18 @@ from type import Type
 
 class BaseAst:
     # text_indices: [int, int]
+    __slots__ = ()
 
     def __init__(self):
         raise RuntimeError("Cannot instantiate BaseAst")
 
 
-@dataclass()
+@dataclass(slots=True)
 class ProgN(BaseAst):
     programs: list[BaseAst]
 
 
-@dataclass(init=False)
+@dataclass(init=False, slots=True)
 class VariableDef(BaseAst):
     name: str
     type: Type
@@ -29,17 +30,17 @@ class VariableDef(BaseAst):
         self.type = type
 
 
-@dataclass
+@dataclass(slots=True)
 class VariableLoad(BaseAst):
     variable: VariableDef
 
 
-@dataclass
+@dataclass(slots=True)
 class UnresolvedVariableLoad(BaseAst):
     variable: str
 
 
-@dataclass()
+@dataclass(slots=True)
 class ConstantLoad(BaseAst):
     type: Type
     constant: Any
@@ -52,7 +53,7 @@ class UntypedFnDef(BaseAst):
     body: list[BaseAst]
 
 
-@dataclass
+@dataclass(slots=True)
 class TypedFnDef(BaseAst):
     name: str
     params: list[VariableDef]
@@ -72,7 +73,7 @@ class UnresolvedFnApp(BaseAst):
     params: list[BaseAst]
 
 
-@dataclass
+@dataclass(slots=True)
 class AstNode:
     instr: Instruction
     operands: list[Union['AstNode', int, str]] = field(default_factory=list)
@@ -86,11 +87,14 @@ class AstNode:
         self.text_indices = node.text_indices
 
     def set_bound_vars(self, new_var: str, value: ir.Value):
-        self.bound_variables[new_var] = value
-        for k in self.operands:
-            match k:
-                case AstNode():
-                    k.set_bound_vars(new_var, value)
+        self.set_bound_vars_batch({new_var: value})
+
+    def set_bound_vars_batch(self, mapping: dict[str, ir.Value]):
+        stack = [self]
+        while stack:
+            n = stack.pop()
+            n.bound_variables.update(mapping)
+            stack.extend(o for o in n.operands if isinstance(o, AstNode))
 
     def get_bound_vars(self, name: str) -> ir.Value:
         try:
@@ -102,27 +106,58 @@ class AstNode:
         return self.curry_type_repr(0)
 
     def repr_operands(self, depth: int) -> str:
-        tail = ""
-        for o in self.operands:
+        stack = []
+        self.push_operands(stack, depth)
+        return render_repr(stack)
+
+    def push_operands(self, stack: list, depth: int):
+        # Pushed in reverse so that popping the stack yields the operands in order
+        for o in reversed(self.operands):
             match o:
                 case AstNode() as o:
-                    tail += f"{' ' * depth}{o.curry_type_repr(depth + 1)}\n"
+                    stack.append("\n")
+                    stack.append((o, depth + 1))
+                    stack.append(indent(depth))
                 case _ as o:
-                    tail += f"{' ' * depth}{o}"
-        return tail
+                    stack.append(str(o))
+                    stack.append(indent(depth))
 
     def curry_type_repr(self, depth: int) -> str:
-        match self.instr:
+        return render_repr([(self, depth)])
+
+
+_INDENT = [' ' * d for d in range(64)]
+
+
+def indent(depth: int) -> str:
+    return _INDENT[depth] if depth < len(_INDENT) else ' ' * depth
+
+
+def render_repr(stack: list[Union[str, tuple[AstNode, int]]]) -> str:
+    parts = []
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+
+        node, depth = item
+        match node.instr:
             case Instruction.NumberConstant:
-                return f"{' ' * depth}C-{self.operands[0]}"
+                parts.append(indent(depth))
+                parts.append(f"C-{node.operands[0]}")
             case Instruction.String1:
-                return f"{' ' * depth}String({self.operands[0]})"
+                parts.append(indent(depth))
+                parts.append(f"String({node.operands[0]})")
             case Instruction.Unknown:
-                match self.operands:
+                match node.operands:
                     case [x] if not isinstance(x, AstNode):
-                        return f"{self.repr_operands(depth)}"
+                        node.push_operands(stack, depth)
                     case _:
-                        return f"{' ' * depth}UK-(\n{self.repr_operands(depth + 1)}"
+                        parts.append(indent(depth))
+                        parts.append("UK-(\n")
+                        node.push_operands(stack, depth + 1)
             case _:
-                head = f"{self.instr}"
-                return f"{head}\n{self.repr_operands(depth + 1)}"
+                parts.append(f"{node.instr}\n")
+                node.push_operands(stack, depth + 1)
+    return "".join(parts)
@@ -1,13 +1,12 @@
 # Compile (+ (arg1) (arg2))
-import copy
 from pprint import pformat
-from typing import Optional, Union
+from typing import Optional
 
 from astnode import AstNode, BaseAst, UnresolvedFnApp, TypedFnDef, VariableDef, ProgN, UnresolvedVariableLoad, \
     ConstantLoad, FunctionApplication
 from function_stub import FunctionStub
 from instruction import Instruction
-from parser import flatten_tree, lexer, parse_all
+from parser import Parser, lexer
 from type import Type
 from type_inference import type_annotator
 
@@ -20,48 +19,16 @@ def pprint(x):
 global_namespace = {}
 
 
-def convert_string_to_str(*args: AstNode) -> list[str]:
-    def mapper(a: AstNode) -> str:
-        match a:
-            case AstNode(Instruction.String1, [str() as s]):
-                return s
-            case _:
-                raise RuntimeError
-
-    return list(map(mapper, args))
-
-
-def separate_defuns(node: AstNode) -> tuple[list[FunctionStub], Union[AstNode, None]]:
+def defun_to_stub(node: AstNode) -> FunctionStub:
     match node:
-        case AstNode(Instruction.Mult | Instruction.Add, [_, _]):
-            pass
-        case AstNode(Instruction.Negate | Instruction.String1 | Instruction.NumberConstant, [_]):
-            pass
         case AstNode(Instruction.Defun,
-                     [AstNode(Instruction.String1, [name]), AstNode(Instruction.LambdaParams, [*params]), fn_body]):
-            params = convert_string_to_str(*params)
-
-            stub = FunctionStub(node, name=name, params_list=params, body=fn_body)
-            return [stub], None
-        case AstNode(Instruction.LambdaParams | Instruction.Unknown | Instruction.Module, _):
-            pass
+                     [AstNode(Instruction.String1, [name]), AstNode(Instruction.LambdaParams, params), fn_body]):
+            assert all((p.instr == Instruction.String1 for p in params))
+            param_names = [p.operands[0] for p in params]
+            return FunctionStub(node, name=name, params_list=param_names, body=fn_body)
         case _:
             raise RuntimeError("Compile error at node ", node)
 
-    functions = []
-    new_operands = []
-    for j in node.operands:
-        if isinstance(j, AstNode):
-            functions_list, new_node = separate_defuns(j)
-            functions.extend(functions_list)
-            if new_node:
-                new_operands.append(new_node)
-        else:
-            new_operands.append(j)
-    node.operands = new_operands
-
-    return functions, node
-
 
 def insert_not_exists(dict, key, value):
     assert key not in dict
@@ -82,20 +49,26 @@ def type_lookup(d: dict[Type, Type], k) -> Type:
 def resolve_all_function_calls(functions: list[TypedFnDef]) -> list[TypedFnDef]:
     function_name_map = {x.name: x for x in functions}
 
+    # Rewrites the tree in place where the node type stays the same; ordered by how common each node is
     def recursive_resolver(a: BaseAst) -> BaseAst:
-        match a:
-            case TypedFnDef():
-                a.body = recursive_resolver(a.body)
-                return a
-            case UnresolvedFnApp(fn, params):
-                resolved_params = [recursive_resolver(p) for p in params]
-                return FunctionApplication(function_name_map[fn], resolved_params)
-            case ProgN(programs):
-                return ProgN([recursive_resolver(x) for x in programs])
-            case _:
-                return a
+        if isinstance(a, UnresolvedFnApp):
+            fn = function_name_map.get(a.fn)
+            if fn is None:
+                raise RuntimeError(f"Call to undefined function {a.fn}")
+            params = a.params
+            for i, p in enumerate(params):
+                params[i] = recursive_resolver(p)
+            return FunctionApplication(fn, params)
+        elif isinstance(a, TypedFnDef):
+            a.body = recursive_resolver(a.body)
+        elif isinstance(a, ProgN):
+            programs = a.programs
+            for i, x in enumerate(programs):
+                programs[i] = recursive_resolver(x)
+        return a
+
+    return [recursive_resolver(f) for f in functions]
 
-    return list(map(recursive_resolver, functions))
 
 def convert_to_baseast(a: FunctionStub, type_solutions: dict[Type, Type]) -> TypedFnDef:
     def create_variable_defs(params: list[str]) -> list[VariableDef]:
@@ -116,7 +89,8 @@ def convert_to_baseast(a: FunctionStub, type_solutions: dict[Type, Type]) -> Typ
             case Instruction.String1:
                 return UnresolvedVariableLoad(n.operands[0])
             case Instruction.NumberConstant:
-                return ConstantLoad(Type("int"), n.operands[0])
+                constant = n.operands[0]
+                return ConstantLoad(Type("float" if isinstance(constant, float) else "int"), constant)
             case Instruction.Add | Instruction.Mult as operation:
                 lhs, rhs = n.operands
                 name = "Operator+" if operation == Instruction.Add else "Operator*"
@@ -149,9 +123,9 @@ a = lexer("(defun norm(x y z) (sqrt (+ (*  x x) (*  y y) (*  z z))))"
           "(defun sqrt(x) (pow x 0.5))"
           "(defun main() ((norm 30.0 20.0 50.0) (print 1 2 3)))"
           "")
-a = AstNode(Instruction.Module, parse_all(a))
-a = flatten_tree(a)
-functions, script = separate_defuns(a)
+program = Parser(a)
+a = AstNode(Instruction.Module, program.parse_all())
+functions = [defun_to_stub(d) for d in program.defuns]
 
 main_fn = next(x for x in functions if x.name == "main")
 
@@ -159,8 +133,10 @@ std_types = {Type("sqrt"): Type("float", "float"),
              Type("pow"): Type("float", "float"),
              Type("sqrti"): Type("int", "float"),
              Type("normiEE"): Type("int", "int", "int", "float")}
-[f.annotate_type() for f in functions]
-[main_fn.unify_with_other(f.intermediate_types) for f in functions]
+for f in functions:
+    f.annotate_type()
+for f in functions:
+    main_fn.unify_with_other(f.intermediate_types)
 
 main_fn.unify_with_other(std_types)
 application = Type(["void"])
@@ -195,7 +171,7 @@ def compile1(builder: Optional[ir.IRBuilder], ast: AstNode):
 
             args = func.args
 
-            _ = [ast.set_bound_vars(name.operands[0], value) for name, value in zip(params_list, args)]
+            ast.set_bound_vars_batch({name.operands[0]: value for name, value in zip(params_list, args)})
             result = compile1(builder, fn_body)
             builder.ret(result)
         case Instruction.Add | Instruction.Mult as instr:
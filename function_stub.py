@@ -1,12 +1,12 @@
-import copy
 from dataclasses import dataclass, field
 
 from astnode import AstNode
 from type import Type, TypeConstraint
-from type_inference import type_annotator, unify_vars, unify_type_dicts, unify_constraints, simplify_unification
+from type_inference import type_annotator, unify_vars, unify_type_dicts, unify_constraints, unify_solutions, \
+    TypeUnionFind
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionStub:
     node: AstNode
     name: str
@@ -22,10 +22,11 @@ class FunctionStub:
                 assert len(types) == len(self.intermediate_types[self.my_type].type)
             case _:
                 raise RuntimeError("Compile failed")
-        solution = unify_vars(self.my_type, args, copy.deepcopy(self.intermediate_types))
-        simplify_unification(solution)
+        uf = TypeUnionFind()
+        unify_solutions(self.intermediate_types, uf)
+        unify_vars(self.my_type, args, uf)
+        solution = uf.solutions()
 
-        print(solution)
         assert all((solution[t].is_base_type() for t in solution)), "Type must be fully resolved at this point"
         return solution[self.my_type]
 
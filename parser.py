@@ -1,100 +1,160 @@
-from functools import reduce
+import re
+from itertools import islice
 
 from astnode import AstNode
 from instruction import Instruction
 
 
 def is_number(a: str) -> bool:
-    return all((c.isdigit() or c == '.' for c in a))
-
-
-def take_two(tokens: list[str]) -> tuple[AstNode, AstNode, list[str]]:
-    LHS, next = parser(tokens)
-    RHS, next = parser(next)
-    return LHS, RHS, next
-
-
-def take_until(next: list[str], until: str) -> tuple[list[AstNode], list[str]]:
-    total_result = []
-    while len(next) > 0 and next[0] != until:
-        result, next = parser(next)
-        total_result.append(result)
-    return total_result, next
-
-
-def parser(tokens: list[str]) -> tuple[AstNode, list[str]]:
-    match tokens:
-        case ['(', *next]:
-            total_result, next = take_until(next, ')')
-            assert next[0] == ')'
-            return AstNode(Instruction.Unknown, total_result), next[1:]
-        case ['+', *rest]:
-            token_result, next = take_until(rest, ')')
-            assert next[0] == ')'
-            return reduce(lambda k1, k2: AstNode(Instruction.Add, [k1, k2]), token_result), next
-        case ['-', *rest]:
-            token_result, next = take_until(rest, ')')
-            assert next[0] == ')'
-            token_result[1:] = list(map(lambda k: AstNode(Instruction.Negate, k), token_result[1:]))
-
-            return reduce(lambda k1, k2: AstNode(Instruction.Add, [k1, k2]), token_result), next
-        case ['*', *rest]:
-            token_result, next = take_until(rest, ')')
-            assert next[0] == ')'
-            return reduce(lambda k1, k2: AstNode(Instruction.Mult, [k1, k2]), token_result), next
-        case [x, *rest] if is_number(x):
-            return AstNode(Instruction.NumberConstant, [x]), rest
-        case [x, *rest]:
-            return AstNode(Instruction.String1, [x]), rest
-
-
-def flatten_tree(node: AstNode) -> AstNode:
-    match node:
-        case AstNode(Instruction.NumberConstant) | AstNode(Instruction.String1):
-            return node
-        case AstNode(Instruction.Unknown, [AstNode() as curry_type_node]):
-            node = flatten_tree(curry_type_node)
-            return node
-        case AstNode(Instruction.Unknown, _) as uk_node:
-            match uk_node.operands:
-                case [AstNode(Instruction.String1, ["lambda"]), AstNode(Instruction.Unknown, [*lambda_params]), fn_body]:
+    return a.replace('.', '', 1).isdecimal() if a else False
+
+
+def left_fold(instr: Instruction, items: list[AstNode], negate_rest: bool = False) -> AstNode:
+    # (op a b c) -> (op (op a b) c); subtraction is folded as addition of the negated tail
+    if not items:
+        raise RuntimeError("operator with no operands")
+    acc = items[0]
+    for x in islice(items, 1, None):
+        if negate_rest:
+            x = AstNode(Instruction.Negate, [x])
+        acc = AstNode(instr, [acc, x])
+    return acc
+
+
+class Parser:
+    def __init__(self, tokens: list[str]):
+        self.tokens = tokens
+        self.pos = 0
+        # Function definitions lifted out of the tree, in source order
+        self.defuns: list[AstNode] = []
+        self.defun_depth = 0
+
+    def take_until(self, until: str) -> list[AstNode]:
+        total_result = []
+        while self.pos < len(self.tokens) and self.tokens[self.pos] != until:
+            total_result.append(self.parse_expr())
+        return total_result
+
+    def expect(self, token: str):
+        assert self.tokens[self.pos] == token
+
+    def drop_defuns(self, nodes: list[AstNode]) -> list[AstNode]:
+        # Definitions outside of any function body already went to self.defuns; nested ones stay in their body
+        if self.defun_depth > 0:
+            return nodes
+        return [n for n in nodes if n.instr != Instruction.Defun]
+
+    def lift_defuns(self, node: AstNode):
+        # A group that fell back from a definition was parsed as if inside a function body. Lift the definitions
+        # a top-level parse would have lifted, in source order, without entering the bodies of real definitions.
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n.instr == Instruction.Defun:
+                self.defuns.append(n)
+                continue
+            children = [o for o in n.operands if isinstance(o, AstNode)]
+            n.operands = [o for o in n.operands if not (isinstance(o, AstNode) and o.instr == Instruction.Defun)]
+            stack.extend(reversed(children))
+
+    def parse_defun(self) -> AstNode | None:
+        # (defun name (params) body) or (lambda (params) body), with the opening '(' already consumed.
+        # Returns None if the group does not start like a definition. Otherwise the group is parsed exactly once
+        # and becomes either a Defun or, if the rest does not fit, an ordinary application of "defun"/"lambda".
+        keyword = self.tokens[self.pos]
+        match self.tokens[self.pos:self.pos + 3]:
+            case ["lambda", "(", *_]:
+                head = [AstNode(Instruction.String1, [keyword])]
+                # Named before the body is parsed, so nested lambdas are numbered outside-in
+                fn_name = gen_random_name()
+                self.pos += 2
+            case ["defun", name, "("] if name not in ('(', ')') and not is_number(name):
+                fn_name = AstNode(Instruction.String1, [name])
+                head = [AstNode(Instruction.String1, [keyword]), fn_name]
+                self.pos += 3
+            case _:
+                return None
+
+        self.defun_depth += 1
+        lambda_params = self.take_until(')')
+        self.expect(')')
+        self.pos += 1
+        rest = self.take_until(')')
+        self.defun_depth -= 1
+        self.expect(')')
+        self.pos += 1
+
+        match rest:
+            case [fn_body]:
+                if keyword == "lambda":
                     assert all((param.instr == Instruction.String1 for param in lambda_params))
-
-                    node.instr = Instruction.Defun
-                    node.operands = [gen_random_name(), AstNode(Instruction.LambdaParams, lambda_params), fn_body]
-                case [AstNode(Instruction.String1, ["defun"]), AstNode(Instruction.String1, [_]) as fn_name,
-                      AstNode(Instruction.Unknown, [*lambda_params]),
-                      fn_body]:
-                    node.instr = Instruction.Defun
-                    node.operands = [fn_name, AstNode(Instruction.LambdaParams, lambda_params), fn_body]
-    node.operands = list(map(lambda k: flatten_tree(k), node.operands))
-
-    return node
+                defun = AstNode(Instruction.Defun, [fn_name, AstNode(Instruction.LambdaParams, lambda_params), fn_body])
+                if self.defun_depth == 0:
+                    self.defuns.append(defun)
+                return defun
+
+        match lambda_params:
+            case [single]:
+                params_group = single
+            case _:
+                params_group = AstNode(Instruction.Unknown, lambda_params)
+        node = AstNode(Instruction.Unknown, [*head, params_group, *rest])
+        if self.defun_depth == 0:
+            self.lift_defuns(node)
+        return node
+
+    def fold_operands(self, instr: Instruction, negate_rest: bool = False) -> AstNode:
+        items = self.take_until(')')
+        self.expect(')')
+        operands = self.drop_defuns(items)
+        if not operands:
+            # Every operand was a lifted definition: a lone one stands in for the result, otherwise the node is empty
+            return items[0] if len(items) == 1 else AstNode(instr, [])
+        return left_fold(instr, operands, negate_rest)
+
+    def parse_expr(self) -> AstNode:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        match token:
+            case '(':
+                node = self.parse_defun()
+                if node is not None:
+                    return node
+                total_result = self.take_until(')')
+                self.expect(')')
+                self.pos += 1
+                match total_result:
+                    case [single]:
+                        return single
+                    case _:
+                        return AstNode(Instruction.Unknown, self.drop_defuns(total_result))
+            case '+':
+                return self.fold_operands(Instruction.Add)
+            case '-':
+                return self.fold_operands(Instruction.Add, negate_rest=True)
+            case '*':
+                return self.fold_operands(Instruction.Mult)
+            case x if is_number(x):
+                return AstNode(Instruction.NumberConstant, [int(x) if x.isdecimal() else float(x)])
+            case x:
+                return AstNode(Instruction.String1, [x])
+
+    def parse_all(self) -> list[AstNode]:
+        # Top-level forms are read in a loop, so neither time nor stack depth grows with the number of forms
+        out = []
+        while self.pos < len(self.tokens):
+            node = self.parse_expr()
+            # Top-level definitions have already been lifted into self.defuns
+            if node.instr != Instruction.Defun:
+                out.append(node)
+        return out
+
+
+_TOK_RE = re.compile(r"[()]|[^\s()]+")
 
 
 def lexer(str: str) -> list[str]:
-    words = []
-    current_word = ""
-    for c in str:
-        match c:
-            case ' ':
-                words.append(current_word)
-                current_word = ""
-            case '(' | ')' as x:
-                words.append(current_word)
-                current_word = ""
-                words.append(x)
-            case c:
-                current_word += c
-
-    return list(filter(lambda k: k != "", words))
-
-
-def parse_all(a: [str]) -> [AstNode]:
-    if a == []:
-        return []
-    a, next = parser(a)
-    return [a, *parse_all(next)]
+    return _TOK_RE.findall(str)
 
 
 name_counter = 1
@@ -0,0 +1,25 @@
+from astnode import AstNode
+from instruction import Instruction
+from parser import Parser, lexer
+
+
+def parse(src: str) -> tuple[list[AstNode], list[AstNode]]:
+    p = Parser(lexer(src))
+    return p.parse_all(), p.defuns
+
+
+def defun_names(defuns: list[AstNode]) -> list[str]:
+    return [d.operands[0].operands[0] for d in defuns]
+
+
+def test_operator_of_only_definitions():
+    # Every operand is lifted out, which used to leave nothing to fold
+    forms, defuns = parse("(+ (defun g () 1))")
+    assert forms == [] and defun_names(defuns) == ["g"]
+
+    forms, defuns = parse("(main (+ (defun g (x) x)))")
+    assert len(forms) == 1 and forms[0].operands == [AstNode(Instruction.String1, ["main"])]
+    assert defun_names(defuns) == ["g"]
+
+    forms, defuns = parse("(* (defun g () 1) (defun h () 2))")
+    assert forms == [AstNode(Instruction.Mult, [])] and defun_names(defuns) == ["g", "h"]
@@ -1,12 +1,13 @@
-import copy
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from llvmlite import ir
 
 
-@dataclass(init = False)
+@dataclass(init = False, slots=True)
 class Type:
     type: list['Type'] | str
+    _hash: int | None = field(default=None, init=False, compare=False, repr=False)
+    _base_cached: bool | None = field(default=None, init=False, compare=False, repr=False)
 
     def into_ir_type(self) -> ir.Type:
         match self.type:
@@ -18,7 +19,14 @@ class Type:
                 raise RuntimeError
 
 
-    def __init__(self, *args):
+    def __new__(cls, *args):
+        match args:
+            case [str() as s] | [Type(type=str() as s)] if s in _PRIMITIVE_POOL:
+                return _PRIMITIVE_POOL[s]
+
+        self = object.__new__(cls)
+        self._hash = None
+        self._base_cached = None
         match args:
             case [Type() as t]:
                 self.type = t.type
@@ -26,15 +34,19 @@ class Type:
                 self.type = s
             case [[*params]] | [*params]:
                 self.type = [Type(p) if isinstance(p, str) else p for p in params ]
+        return self
 
     def is_base_type(self) -> bool:
+        if self._base_cached is not None:
+            return self._base_cached
         match self.type:
             case "float" | "int" | "void":
-                return True
+                self._base_cached = True
             case [*t]:
-                return all((u.is_base_type() for u in t if isinstance(u, Type)))
+                self._base_cached = all((u.is_base_type() for u in t if isinstance(u, Type)))
             case _:
-                return False
+                self._base_cached = False
+        return self._base_cached
 
     def __repr__(self):
         match self.type:
@@ -43,31 +55,41 @@ class Type:
             case [*types]:
                 return f"({', '.join(map(str, types))})"
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Type):
+            return NotImplemented
+        match self.type, other.type:
+            case str() as s1, str() as s2:
+                return s1 == s2
+            case [*t1], [*t2]:
+                return len(t1) == len(t2) and all(x1 == x2 for x1, x2 in zip(t1, t2))
+            case _:
+                return False
+
     def __hash__(self):
-        return 1
-        # match self.type:
-        #     case str() as s:
-        #         return s.__hash__()
-        #     case (T1, T2):
-        #         return T1.__hash__() + T2.__hash__()
-        #     case _:
-        #         raise RuntimeError("what")
+        # Types are never mutated after construction, so the structural hash is computed once
+        if self._hash is None:
+            match self.type:
+                case str() as s:
+                    self._hash = hash(s)
+                case [*types]:
+                    self._hash = hash(tuple(hash(t) for t in types))
+        return self._hash
 
-    def clone(self) -> 'Type':
-        return copy.deepcopy(self)
 
-    def set(self, other: 'Type'):
-        self.type = other.type
+# Types are immutable, so every Type("int") etc. is the same instance
+_PRIMITIVE_POOL: dict[str, Type] = {}
+_PRIMITIVE_POOL.update((s, Type(s)) for s in ("int", "float", "void"))
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeConstraint:
     lhs: Type
     rhs: Type
 
     def __hash__(self):
-        l = self.lhs.__hash__()
-        r = self.rhs.__hash__()
-        return l + r
+        return hash((self.lhs, self.rhs))
 
 
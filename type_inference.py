@@ -1,9 +1,7 @@
-import copy
-from typing import Callable
+from dataclasses import dataclass, field
 
 from astnode import AstNode
 from instruction import Instruction
-from parser import is_number
 from type import TypeConstraint, Type
 
 type_var_counter = 0
@@ -19,9 +17,9 @@ def get_unknown_type_var(var_name: str = None) -> str:
 
 def type_annotator(fn: AstNode, constraints: list[TypeConstraint]) -> Type:
     match fn:
-        case AstNode(Instruction.NumberConstant, [x]) if x.isnumeric() or isinstance(x, int):
+        case AstNode(Instruction.NumberConstant, [int()]):
             return Type('int')
-        case AstNode(Instruction.NumberConstant, [x]) if is_number(x):
+        case AstNode(Instruction.NumberConstant, [float()]):
             return Type("float")
         case AstNode(Instruction.String1, [str() as var_name]) | (str() as var_name):
             return Type(get_unknown_type_var(var_name))
@@ -50,86 +48,115 @@ def type_annotator(fn: AstNode, constraints: list[TypeConstraint]) -> Type:
             return operands_type[-1]
 
 
-def unify_vars(one: Type, two: Type, solutions: dict[Type, Type]) -> dict[Type, Type]:
-    match one, two:
-        case Type([*t1]), Type([*t2]):
-            [unify_vars(x1, x2, solutions) for x1, x2 in zip(t1, t2)]
-            return solutions
-        case Type(x), Type(x1):
-            if one == two:
-                return solutions
-            if one in solutions:
-                return unify_vars(solutions[one], two, solutions)
-            if two in solutions:
-                return unify_vars(one, solutions[two], solutions)
-            match one.is_base_type(), two.is_base_type():
-                # Primitive types
-                case True, True:
-                    assert one == two, f"Primitive types don't match {one} != {two}"
-                case ((True, False) as order) | ( (False, True) as order):
-                    print(f"Inserting() {two}/{one}")
-
-                    # If first is base type
-                    if order[0]:
-                        solutions[two.clone()] = one.clone()
-                    # If second is base type
-                    else:
-                        solutions[one.clone()] = two.clone()
-
-                case False, False:
-                    print(f"Inserting {one}/{two}")
-                    solutions[one.clone()] = two.clone()
-                case _:
-                    raise RuntimeError
-
-            return solutions
-
+@dataclass
+class TypeUnionFind:
+    # Every Type seen gets a dense integer id; parent/rank form the union-find forest over those ids.
+    # Variables and primitives are identified by name, tuples by instance.
+    type_to_id: dict[Type, int] = field(default_factory=dict)
+    tuple_to_id: dict[int, int] = field(default_factory=dict)
+    types: list[Type] = field(default_factory=list)
+    parent: list[int] = field(default_factory=list)
+    rank: list[int] = field(default_factory=list)
+
+    def id_of(self, t: Type) -> int:
+        is_tuple = isinstance(t.type, list)
+        ids = self.tuple_to_id if is_tuple else self.type_to_id
+        key = id(t) if is_tuple else t
+        i = ids.get(key)
+        if i is None:
+            i = len(self.types)
+            ids[key] = i
+            self.types.append(t)
+            self.parent.append(i)
+            self.rank.append(0)
+            if is_tuple:
+                for u in t.type:
+                    self.id_of(u)
+        return i
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a: int, b: int):
+        # The more concrete type (primitive > tuple > variable) stays the representative, then the higher rank,
+        # then the existing representative of `a`
+        root, child = a, b
+        if (concreteness(self.types[b]), self.rank[b]) > (concreteness(self.types[a]), self.rank[a]):
+            root, child = b, a
+        self.parent[child] = root
+        if self.rank[root] == self.rank[child]:
+            self.rank[root] += 1
+
+    def resolve(self, i: int, resolved: dict[int, Type], visiting: set[int]) -> Type:
+        root = self.find(i)
+        if root in resolved:
+            return resolved[root]
+        t = self.types[root]
+        # Unbound variables stand for themselves; a tuple that contains itself is not unrolled any further
+        if isinstance(t.type, str) or root in visiting:
+            return t
+
+        visiting.add(root)
+        result = Type([self.resolve(self.id_of(u), resolved, visiting) for u in t.type])
+        visiting.discard(root)
+        resolved[root] = result
+        return result
+
+    def solutions(self) -> dict[Type, Type]:
+        resolved = {}
+        solutions = {}
+        for i, t in enumerate(self.types):
+            if isinstance(t.type, str) and not t.is_base_type() and self.find(i) != i:
+                solutions[t] = self.resolve(i, resolved, set())
+        return solutions
+
+
+def concreteness(t: Type) -> int:
+    match t.type:
+        case [*_]:
+            return 1
+        case _ if t.is_base_type():
+            return 2
+        case _:
+            return 0
+
+
+def unify_vars(one: Type, two: Type, uf: TypeUnionFind):
+    a = uf.find(uf.id_of(one))
+    b = uf.find(uf.id_of(two))
+    if a == b:
+        return
+
+    one, two = uf.types[a], uf.types[b]
+    match one.type, two.type:
+        case [*t1], [*t2]:
+            uf.union(a, b)
+            for x1, x2 in zip(t1, t2):
+                unify_vars(x1, x2, uf)
+        case _ if one.is_base_type() and two.is_base_type():
+            assert one == two, f"Primitive types don't match {one} != {two}"
         case _:
-            raise RuntimeError("Invalid types")
+            uf.union(a, b)
 
 
-def unify_type_dicts(one: dict[Type, Type], two: dict[Type, Type]) -> dict[Type, Type]:
-    ret_dict = copy.copy(one)
+def unify_solutions(solutions: dict[Type, Type], uf: TypeUnionFind):
+    for t, solution in solutions.items():
+        unify_vars(t, solution, uf)
+
 
-    for o in one:
-        ret_dict[o] = ret_dict[o]
-        if o in two:
-            unify_vars(ret_dict[o], two[o], ret_dict)
-        else:
-            ret_dict[o] = one[o]
-    for o in two:
-        if o not in one:
-            ret_dict[o] = two[o]
-    return ret_dict
+def unify_type_dicts(one: dict[Type, Type], two: dict[Type, Type]) -> dict[Type, Type]:
+    uf = TypeUnionFind()
+    unify_solutions(one, uf)
+    unify_solutions(two, uf)
+    return uf.solutions()
 
 
 def unify_constraints(constraints: list[TypeConstraint]) -> dict[Type, Type]:
-    solutions = {}
+    uf = TypeUnionFind()
     for c in constraints:
-        unify_vars(c.lhs, c.rhs, solutions)
-
-    simplify_unification(solutions)
-    return solutions
-
-
-def convert_type(base_t: Type, t: Type, converter: Callable[[Type], bool]) -> bool:
-    if t == base_t:
-        return False
-    match t.type:
-        case str():
-            return converter(t)
-        case [*types]:
-            return any([convert_type(base_t, T1, converter) for T1 in types])
-
-
-def simplify_unification(unified: dict[Type, Type]):
-    def demote_constraint(t: Type) -> bool:
-        if t in unified and t != unified[t]:
-            t.set(unified[t])
-            return True
-        return False
-
-    for _ in range(0, 10):
-        for u in unified:
-            if not unified[u].is_base_type():
-                convert_type(u, unified[u], demote_constraint)
\ No newline at end of file
+        unify_vars(c.lhs, c.rhs, uf)
+    return uf.solutions()